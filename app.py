@@ -1,11 +1,40 @@
 import streamlit as st
 import openai
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import os
+import threading
+import time
+from collections import OrderedDict
+import numpy as np
+
+try:
+    from orjson import loads as json_loads
+except ImportError:
+    from json import loads as json_loads
+
+# Fetch API keys from secrets or environment variables. Read on each call (a cheap
+# dict lookup) so a key added later is picked up on the next rerun.
+def _openai_key():
+    return st.secrets.get("OPENAI_API_KEY") or os.getenv("OPENAI_API_KEY")
+
+def _exchange_rate_key():
+    return st.secrets.get("EXCHANGE_RATE_API_KEY") or os.getenv("EXCHANGE_RATE_API_KEY")
+
+@st.cache_resource(show_spinner=False)
+def _openai_client(api_key):
+    """OpenAI client shared across reruns, so its HTTP connection pool is reused."""
+    return openai.OpenAI(api_key=api_key)
+
+def _client():
+    """Return the shared OpenAI client, or None when no API key is configured.
+
+    A missing key is not cached, so a key added later is picked up on the next rerun.
+    """
+    api_key = _openai_key()
+    return _openai_client(api_key) if api_key else None
 
-# Fetch API keys from secrets or environment variables
-openai_api_key = st.secrets.get("OPENAI_API_KEY", os.getenv("OPENAI_API_KEY"))
-exchange_rate_api_key = st.secrets.get("EXCHANGE_RATE_API_KEY", os.getenv("EXCHANGE_RATE_API_KEY"))
 # ---------------------------
 # Conversion Data & Functions
 # ---------------------------
@@ -120,25 +149,37 @@ CONVERSION_FACTORS = {
     # Note: Currency conversion will be handled separately.
 }
 
+# Precomputed multiplier for every (category, from_unit, to_unit) pair,
+# so a conversion is a single lookup and multiply.
+RATIOS = {
+    (cat, f, t): fac[t] / fac[f]
+    for cat, fac in CONVERSION_FACTORS.items()
+    for f in fac
+    for t in fac
+}
+
+# Category and unit lists for the sidebar
+ALL_CATEGORIES = sorted(list(CONVERSION_FACTORS.keys()) + ["Temperature", "Currency"])
+UNITS_BY_CATEGORY = {c: list(v.keys()) for c, v in CONVERSION_FACTORS.items()}
+
 # Temperature units handled via custom function
 TEMPERATURE_UNITS = ["Celsius", "Fahrenheit", "Kelvin"]
 
+# (from_unit, to_unit) -> conversion function
+_TEMP = {
+    ("Celsius", "Fahrenheit"): lambda v: v * 1.8 + 32.0,
+    ("Fahrenheit", "Celsius"): lambda v: (v - 32.0) / 1.8,
+    ("Celsius", "Kelvin"): lambda v: v + 273.15,
+    ("Kelvin", "Celsius"): lambda v: v - 273.15,
+    ("Fahrenheit", "Kelvin"): lambda v: (v - 32.0) / 1.8 + 273.15,
+    ("Kelvin", "Fahrenheit"): lambda v: (v - 273.15) * 1.8 + 32.0,
+}
+
 def convert_temperature(value, from_unit, to_unit):
     if from_unit == to_unit:
         return value
-    if from_unit == "Celsius" and to_unit == "Fahrenheit":
-        return (value * 9/5) + 32
-    if from_unit == "Fahrenheit" and to_unit == "Celsius":
-        return (value - 32) * 5/9
-    if from_unit == "Celsius" and to_unit == "Kelvin":
-        return value + 273.15
-    if from_unit == "Kelvin" and to_unit == "Celsius":
-        return value - 273.15
-    if from_unit == "Fahrenheit" and to_unit == "Kelvin":
-        return (value - 32) * 5/9 + 273.15
-    if from_unit == "Kelvin" and to_unit == "Fahrenheit":
-        return (value - 273.15) * 9/5 + 32
-    return None
+    fn = _TEMP.get((from_unit, to_unit))
+    return fn(value) if fn is not None else None
 
 def convert_units(category, value, from_unit, to_unit):
     """Generic conversion for all categories except Temperature and Currency."""
@@ -148,32 +189,65 @@ def convert_units(category, value, from_unit, to_unit):
         # Currency conversion is handled separately.
         return None
     else:
-        factors = CONVERSION_FACTORS.get(category, {})
-        if from_unit in factors and to_unit in factors:
-            base_value = value / factors[from_unit]
-            return base_value * factors[to_unit]
-    return None
+        r = RATIOS.get((category, from_unit, to_unit))
+        return value * r if r is not None else None
+
+def convert_units_batch(category, values, from_unit, to_unit):
+    """Convert an array of values at once (e.g. a CSV column). Returns None for unknown units."""
+    values = np.asarray(values, dtype=np.float64)
+    if category == "Temperature":
+        if from_unit == to_unit:
+            return values.copy()
+        fn = _TEMP.get((from_unit, to_unit))
+        return fn(values) if fn is not None else None
+    r = RATIOS.get((category, from_unit, to_unit))
+    return values * r if r is not None else None
 
 # ---------------------------
 # Currency Conversion Functions
 # ---------------------------
-def fetch_exchange_rates():
-    """Fetch live exchange rates using ExchangeRate-API."""
-    if not exchange_rate_api_key:
+
+@st.cache_resource(show_spinner=False)
+def _session():
+    """HTTP session shared across reruns, so repeated fetches reuse the pooled TLS connection."""
+    session = requests.Session()
+    session.mount(
+        "https://",
+        HTTPAdapter(
+            pool_connections=4,
+            pool_maxsize=8,
+            max_retries=Retry(total=2, backoff_factor=0.2, status_forcelist=[502, 503, 504]),
+        ),
+    )
+    return session
+
+@st.cache_data(ttl=3600, show_spinner=False)
+def fetch_exchange_rates(api_key):
+    """Fetch live exchange rates using ExchangeRate-API.
+
+    Returns ``(rates, sorted_codes)``, cached per API key for an hour so the
+    currency list is sorted once per fetch. Failures raise instead of
+    returning, so an error response is never cached as success.
+    """
+    url = f"https://v6.exchangerate-api.com/v6/{api_key}/latest/USD"
+    response = _session().get(url, timeout=5)
+    data = json_loads(response.content)
+    if data.get("result") != "success":
+        raise ValueError(data.get("error-type", "unexpected response"))
+    rates = data.get("conversion_rates") or {}
+    return rates, tuple(sorted(rates))
+
+def get_exchange_rates():
+    """Return cached ``(rates, sorted_codes)``, reporting any failure in the UI."""
+    api_key = _exchange_rate_key()
+    if not api_key:
         st.error("Exchange Rate API key not found. Please set it in .streamlit/secrets.toml.")
-        return {}
-    url = f"https://v6.exchangerate-api.com/v6/{exchange_rate_api_key}/latest/USD"
+        return {}, ()
     try:
-        response = requests.get(url)
-        data = response.json()
-        if data.get("result") == "success":
-            return data.get("conversion_rates", {})
-        else:
-            st.error("Error fetching exchange rates.")
-            return {}
+        return fetch_exchange_rates(api_key)
     except Exception as e:
         st.error(f"Error fetching exchange rates: {e}")
-        return {}
+        return {}, ()
 
 def convert_currency(value, from_currency, to_currency, rates):
     if from_currency in rates and to_currency in rates:
@@ -184,49 +258,136 @@ def convert_currency(value, from_currency, to_currency, rates):
 # ---------------------------
 # AI Chat Assistant Function
 # ---------------------------
+def _query_llm_uncached(prompt):
+    """Stream raw completion text from OpenAI's ChatGPT API."""
+    response = _client().chat.completions.create(
+        model="gpt-3.5-turbo",
+        messages=[
+            {"role": "system", "content": "You are a helpful assistant for unit and currency conversions."},
+            {"role": "user", "content": prompt}
+        ],
+        max_tokens=150,
+        temperature=0.7,
+        stream=True,
+    )
+    for chunk in response:
+        if chunk.choices:
+            yield chunk.choices[0].delta.content or ""
+
+# Completed answers are kept for an hour, up to this many prompts.
+ANSWER_TTL = 3600
+MAX_ANSWERS = 256
+
+@st.cache_resource(show_spinner=False)
+def _answer_store():
+    """Completed AI answers keyed by prompt, shared across reruns and sessions."""
+    return threading.Lock(), OrderedDict()
+
+def _get_answer(prompt):
+    """Return the stored answer for a prompt, or None if missing or expired."""
+    lock, answers = _answer_store()
+    with lock:
+        entry = answers.get(prompt)
+        if entry is None:
+            return None
+        answer, stored_at = entry
+        if time.monotonic() - stored_at > ANSWER_TTL:
+            del answers[prompt]
+            return None
+        return answer
+
+def _store_answer(prompt, answer):
+    """Store a completed answer, evicting the oldest once MAX_ANSWERS is reached."""
+    lock, answers = _answer_store()
+    with lock:
+        answers.pop(prompt, None)
+        while len(answers) >= MAX_ANSWERS:
+            answers.popitem(last=False)
+        answers[prompt] = (answer, time.monotonic())
+
 def query_llm(prompt):
-    """Query OpenAI's ChatGPT API for answers."""
-    if not openai_api_key:
-        return "API key not found. Please set it in .streamlit/secrets.toml or environment variables."
+    """Stream an answer from OpenAI's ChatGPT API, serving repeated prompts from cache."""
+    if _client() is None:
+        yield "API key not found. Please set it in .streamlit/secrets.toml or environment variables."
+        return
 
+    answer = _get_answer(prompt)
+    if answer is not None:
+        yield answer
+        return
+
+    chunks = []
     try:
-        if not openai_api_key:
-            return "API key not found. Please set it in .streamlit/secrets.toml."
-        openai.api_key = openai_api_key
-        response = openai.ChatCompletion.create(
-            model="gpt-3.5-turbo",
-            messages=[
-                {"role": "system", "content": "You are a helpful assistant for unit and currency conversions."},
-                {"role": "user", "content": prompt}
-            ],
-            max_tokens=150,
-            temperature=0.7,
-        )
-        return response.choices[0].message.content.strip()
+        for text in _query_llm_uncached(prompt):
+            chunks.append(text)
+            yield text
     except Exception as e:
-        return f"Error querying AI: {e}"
+        yield f"Error querying AI: {e}"
+        return
+    # Only cache non-empty answers that streamed to completion without error.
+    answer = "".join(chunks)
+    if answer.strip():
+        _store_answer(prompt, answer)
     
+# ---------------------------
+# Main Area Sections
+# ---------------------------
+# Each section is a fragment, so interacting with one (e.g. typing in the AI
+# box) reruns only that section instead of the whole script.
+@st.fragment
+def _render_converter(category, value, from_unit, to_unit, rates):
+    st.header("Converter")
+    st.write(f"Converting **{value} {from_unit}** to **{to_unit}** in category **{category}**.")
+    if category == "Currency":
+        conversion_result = convert_currency(value, from_unit, to_unit, rates)
+    else:
+        conversion_result = convert_units(category, value, from_unit, to_unit)
+    if conversion_result is not None:
+        st.markdown("### Conversion Result")
+        st.write(f"**{conversion_result:.4f} {to_unit}**")
+    else:
+        st.write("Conversion error. Please verify your inputs.")
+
+@st.fragment
+def _render_ai():
+    # AI Assistant Section with input and button on the same row
+    st.header("AI Assistant")
+    st.write("Ask questions about unit or currency conversions, measurement systems, or related topics.")
+    ai_col1, ai_col2 = st.columns([4,1])
+    with ai_col1:
+        user_query = st.text_input("Your question for the AI:", "")
+        ask_button = st.button("Ask AI")
+    if ask_button:
+        if user_query.strip():
+            prompt = (f"Provide a concise, clear answer to the following question related to unit/currency conversions and measurement systems: {user_query}")
+            st.markdown("### AI Response")
+            st.write_stream(query_llm(prompt))
+        else:
+            st.warning("Please enter a question.")
+
 # ---------------------------
 # Main App Function
 # ---------------------------
 def main():
+    # Must be the first Streamlit command on every run; the frontend resets the
+    # tab title and favicon on each full rerun.
     st.set_page_config(page_title="Advanced Unit & Currency Converter with AI Assistant", layout="wide")
     st.title("🌐 Advanced Unit & Currency Converter with AI Assistant")
     
     # Sidebar: Converter Settings
     st.sidebar.header("Converter Settings")
-    # Add "Currency" to the list of categories
-    all_categories = sorted(list(CONVERSION_FACTORS.keys()) + ["Temperature", "Currency"])
+    all_categories = ALL_CATEGORIES
     category = st.sidebar.selectbox("Select Conversion Category", options=all_categories)
     
     # Determine unit options based on category
+    rates = {}
     if category == "Temperature":
         units = TEMPERATURE_UNITS
     elif category == "Currency":
-        exchange_rates = fetch_exchange_rates()
-        units = sorted(list(exchange_rates.keys())) if exchange_rates else []
+        # Fetched once per rerun and reused by both converters below.
+        rates, units = get_exchange_rates()
     else:
-        units = list(CONVERSION_FACTORS.get(category, {}).keys())
+        units = UNITS_BY_CATEGORY[category]
     
     from_unit = st.sidebar.selectbox("From Unit", options=units, index=0)
     to_unit = st.sidebar.selectbox("To Unit", options=units, index=0)
@@ -234,7 +395,6 @@ def main():
     
     if st.sidebar.button("Convert"):
         if category == "Currency":
-            rates = fetch_exchange_rates()
             result = convert_currency(value, from_unit, to_unit, rates)
         else:
             result = convert_units(category, value, from_unit, to_unit)
@@ -244,37 +404,11 @@ def main():
             st.sidebar.error("Conversion error. Please check your inputs.")
     
     # Main Area: Detailed Converter
-    st.header("Converter")
-    st.write(f"Converting **{value} {from_unit}** to **{to_unit}** in category **{category}**.")
-    if category == "Currency":
-        rates = fetch_exchange_rates()
-        conversion_result = convert_currency(value, from_unit, to_unit, rates)
-    else:
-        conversion_result = convert_units(category, value, from_unit, to_unit)
-    if conversion_result is not None:
-        st.markdown("### Conversion Result")
-        st.write(f"**{conversion_result:.4f} {to_unit}**")
-    else:
-        st.write("Conversion error. Please verify your inputs.")
+    _render_converter(category, value, from_unit, to_unit, rates)
     
     st.markdown("---")
     
-    # AI Assistant Section with input and button on the same row
-    st.header("AI Assistant")
-    st.write("Ask questions about unit or currency conversions, measurement systems, or related topics.")
-    ai_col1, ai_col2 = st.columns([4,1])
-    with ai_col1:
-        user_query = st.text_input("Your question for the AI:", "")
-        ask_button = st.button("Ask AI")
-    if ask_button:
-        if user_query.strip():
-            prompt = (f"Provide a concise, clear answer to the following question related to unit/currency conversions and measurement systems: {user_query}")
-            with st.spinner("Processing your query..."):
-                ai_response = query_llm(prompt)
-            st.markdown("### AI Response")
-            st.write(ai_response)
-        else:
-            st.warning("Please enter a question.")
+    _render_ai()
 
 if __name__ == "__main__":
     main()